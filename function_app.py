@@ -1,13 +1,85 @@
 import logging
 import azure.functions as func
-from azure.storage.blob import BlobServiceClient
-import requests
-from bs4 import BeautifulSoup
-from textblob import TextBlob
-import json, os, time
+from azure.storage.blob import BlobServiceClient, ContentSettings
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from azure.core.exceptions import ResourceExistsError
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+import orjson
+from collections import OrderedDict
+import asyncio, gzip, hashlib, os, re, threading, time
 
 BLOB_CONNECTION_STRING = os.getenv("BLOB_CONNECTION_STRING")
 
+#Headers and timeouts shared by the BBC homepage and article fetches
+_HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+_HTTP_TIMEOUT = aiohttp.ClientTimeout(sock_connect=3, sock_read=10)
+
+#Blob service client and container clients are created once per worker, not per upload
+_BLOB_SVC = None
+_CONTAINERS = {}
+_CONTAINERS_LOCK = threading.Lock()
+
+def _container(name):
+    global _BLOB_SVC
+    container_client = _CONTAINERS.get(name)
+    if container_client:
+        return container_client
+
+    with _CONTAINERS_LOCK:
+        if name in _CONTAINERS:
+            return _CONTAINERS[name]
+
+        if _BLOB_SVC is None:
+            _BLOB_SVC = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
+
+        container_client = _BLOB_SVC.get_container_client(name)
+        try:
+            #create container if doesn't exist
+            container_client.create_container()
+        except ResourceExistsError:
+            pass
+
+        _CONTAINERS[name] = container_client
+        return container_client
+
+#Async equivalents, used by the async functions running on the worker's event loop
+_ASYNC_BLOB_SVC = None
+_ASYNC_CONTAINERS = {}
+
+async def _async_container(name):
+    global _ASYNC_BLOB_SVC
+    container_client = _ASYNC_CONTAINERS.get(name)
+    if container_client:
+        return container_client
+
+    if _ASYNC_BLOB_SVC is None:
+        _ASYNC_BLOB_SVC = AsyncBlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
+
+    container_client = _ASYNC_BLOB_SVC.get_container_client(name)
+    try:
+        #create container if doesn't exist
+        await container_client.create_container()
+    except ResourceExistsError:
+        pass
+
+    _ASYNC_CONTAINERS[name] = container_client
+    return container_client
+
+#VADER sentiment analyser (lexicon ships with the package, so nothing is downloaded at cold start)
+_VADER = SentimentIntensityAnalyzer()
+
+#Recently processed article URLs (oldest first), so repeat stories across timer runs are skipped
+_SEEN_URLS = OrderedDict()
+_SEEN_URLS_MAX = 256
+
+#Restrict homepage and article page parsing to the parts that are actually extracted
+_LINK_FILTER = SoupStrainer('a', href=re.compile(r'^/news/articles'))
+_ARTICLE_FILTER = SoupStrainer(['h1', 'article'])
+
 app = func.FunctionApp()
 
 '''
@@ -17,7 +89,7 @@ scraping the article's title and contents to a Blob container.
 '''
 # cron schedule for every hour (and when first run):
 @app.timer_trigger(schedule="0 * * * *", arg_name="myTimer", run_on_startup=True, use_monitor=False) 
-def timer_trigger(myTimer: func.TimerRequest) -> None:
+async def timer_trigger(myTimer: func.TimerRequest) -> None:
     start_time = time.time()
 
     if myTimer.past_due:
@@ -25,67 +97,84 @@ def timer_trigger(myTimer: func.TimerRequest) -> None:
 
     logging.info(f"Timer Trigger started at: {start_time:.3f}")
 
-    fetch_live_articles()
+    await fetch_live_articles()
 
     end_time = time.time()
     logging.info(f"Timer Trigger completed at: {end_time:.3f}")
     logging.info(f"Execution time for Timer Trigger: {end_time - start_time:.3f} seconds")
 
-def fetch_live_articles():
+async def fetch_live_articles():
     url = 'https://www.bbc.com/news'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
 
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching BBC News homepage: {e}")
-        return
+    #One connector for the whole run, so DNS and TLS setup to bbc.com are shared by every fetch
+    connector = aiohttp.TCPConnector(limit=16, limit_per_host=10, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, headers=_HTTP_HEADERS, timeout=_HTTP_TIMEOUT) as session:
+        try:
+            homepage = await fetch_page(session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Error fetching BBC News homepage: {e}")
+            return
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+        article_links = await asyncio.to_thread(extract_article_links, homepage)
 
-    #Find all links on the page that start with '/news/live'
-    articles = soup.find_all('a', href=lambda href: href and href.startswith('/news/articles'))
+        #Skip articles already processed by an earlier run on this worker
+        new_links = [link for link in article_links if link not in _SEEN_URLS]
+        if len(new_links) < len(article_links):
+            logging.info(f"Skipping {len(article_links) - len(new_links)} previously processed articles.")
+
+        #Fetch every article concurrently
+        results = await asyncio.gather(*(process_article(session, link) for link in new_links))
+
+    for link, processed in zip(new_links, results):
+        if processed:
+            _SEEN_URLS[link] = None
+    while len(_SEEN_URLS) > _SEEN_URLS_MAX:
+        _SEEN_URLS.popitem(last=False)
+
+async def fetch_page(session, url):
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.read()
+
+def extract_article_links(homepage):
+    #Only links on the page that start with '/news/articles' are kept while parsing
+    soup = BeautifulSoup(homepage, 'lxml', parse_only=_LINK_FILTER)
+    articles = soup.find_all('a', limit=10)
 
     article_links = set()
-    for article in articles[:10]: #retrieve the first 10 articles
+    for article in articles: #the first 10 articles
         href = article['href']
         full_url = f"https://www.bbc.com{href}" 
         article_links.add(full_url)
 
-    #Process each article
-    for link in article_links:
-        process_article(link)
-
-def process_article(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
+    return article_links
 
+async def process_article(session, url):
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
+        page = await fetch_page(session, url)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logging.error(f"Error fetching article {url}: {e}")
-        return
+        return False
+
+    #Parse and upload off the event loop so other fetches are not stalled
+    return await asyncio.to_thread(parse_and_save_article, url, page)
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+def parse_and_save_article(url, page):
+    #Only the title and article body are needed, so skip building the rest of the page
+    soup = BeautifulSoup(page, 'lxml', parse_only=_ARTICLE_FILTER)
 
     # Extract title
     title_tag = soup.find('h1')
     title = title_tag.get_text(strip=True) if title_tag else 'No Title Found'
 
-    # Extract article body
+    # Extract article body text in a single pass over the <article> node
     article_body = soup.find('article')
-    paragraphs = article_body.find_all('p') if article_body else []
-    content = ' '.join(p.get_text(strip=True) for p in paragraphs)
+    content = article_body.get_text(separator=' ', strip=True) if article_body else ''
 
     #rare case of empty article
     if not content:
         logging.warning(f"No content found for article {url}")
-        return
+        return False
 
     #place data into structued format
     article_data = {
@@ -97,29 +186,32 @@ def process_article(url):
     # logging.info(f"Processed article: {article_data}")
 
     # Save to Blob
-    blob_name = f"article-{title.replace(' ', '_')}.json"
-    save_to_blob(article_data, blob_name)
+    return save_to_blob(article_data, article_blob_name(title))
+
+def article_blob_name(title):
+    #Short ASCII prefix for readability plus a hash of the full title, so names are always
+    #valid, bounded in length and distinct for titles sharing the same prefix
+    base = re.sub(r'[^A-Za-z0-9]+', '_', title)[:40].strip('_')
+    digest = hashlib.blake2b(title.encode('utf-8'), digest_size=6).hexdigest()
+    return f"article-{base}-{digest}.json" if base else f"article-{digest}.json"
 
 def save_to_blob(data, blob_name):
     try:
-        #Initialise BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
-
-        #Get the articles-data container
-        container_client = blob_service_client.get_container_client("articles-data")
-        if not container_client.exists(): 
-            #create container if doesn't exist
-            container_client.create_container()
-
-        #Upload the JSON data as a blob
-        blob_client = container_client.get_blob_client(blob_name)
-        blob_content = json.dumps(data, ensure_ascii=False, indent=4)
-        blob_client.upload_blob(blob_content, overwrite=True)
+        #Upload the JSON data as a blob to the articles-data container
+        blob_client = _container("articles-data").get_blob_client(blob_name)
+        #Article text compresses well, so store it gzipped to cut upload and BlobTrigger read size
+        blob_content = gzip.compress(orjson.dumps(data), compresslevel=4)
+        content_settings = ContentSettings(content_type='application/json', content_encoding='gzip')
+        #Large articles are split into blocks and uploaded in parallel
+        blob_client.upload_blob(blob_content, overwrite=True, max_concurrency=4, length=len(blob_content),
+                                content_settings=content_settings)
 
         logging.info(f"Uploaded {blob_name} to Blob Storage in container articles-data.")
+        return True
 
     except Exception as e:
         logging.error(f"Error uploading to Blob Storage: {e}")
+        return False
 
 
 '''
@@ -130,7 +222,9 @@ saving it to the articles-sentiment container.
 '''
 @app.blob_trigger(arg_name="myblob", path="articles-data/{name}",
                   connection="BLOB_CONNECTION_STRING") 
-def BlobTrigger(myblob: func.InputStream):
+@app.blob_output(arg_name="outputblob", path="articles-sentiment/sentiment-{name}",
+                 connection="BLOB_CONNECTION_STRING")
+async def BlobTrigger(myblob: func.InputStream, outputblob: func.Out[bytes]):
     logging.info(f"Python blob trigger function processed blob\n"
                  f"Name: {myblob.name}\n"
                  f"Blob Size: {myblob.length} bytes")
@@ -140,7 +234,10 @@ def BlobTrigger(myblob: func.InputStream):
     try:
         # Read the blob content
         blob_content = myblob.read()
-        article_data = json.loads(blob_content)
+        #Scraped articles are gzipped; InputStream doesn't decode Content-Encoding, so check the magic bytes
+        if blob_content[:2] == b'\x1f\x8b':
+            blob_content = gzip.decompress(blob_content)
+        article_data = orjson.loads(blob_content)
 
         # Extract content from JSON for sentiment analysis
         content = article_data.get('content', '')
@@ -148,10 +245,10 @@ def BlobTrigger(myblob: func.InputStream):
             logging.warning("No content found in the blob data.")
             return
 
-        #Do sentiment analysis
-        blob = TextBlob(content)
-        polarity = blob.sentiment.polarity
-        subjectivity = blob.sentiment.subjectivity
+        #Do sentiment analysis off the event loop, so other invocations on this worker aren't held up
+        scores = await asyncio.to_thread(_VADER.polarity_scores, content)
+        polarity = scores['compound']
+        subjectivity = 1 - scores['neu']
         sentiment = "positive" if polarity > 0 else "negative"
 
         #Append sentiment analysis results to the article data
@@ -166,8 +263,8 @@ def BlobTrigger(myblob: func.InputStream):
         # logging.info(f"Sentiment Analysis: Polarity={polarity}, "
                     #  f"Subjectivity={subjectivity}, Overall Sentiment={sentiment}")
 
-        #Call function to save updated article to the articles-sentiment container
-        save_to_blob_with_sentiment(article_data, f"sentiment-{myblob.name}")
+        #Save updated article to the articles-sentiment container via the output binding
+        outputblob.set(orjson.dumps(article_data))
 
         end_time = time.time()
         logging.info(f"Total processing time for blob {myblob.name}: {end_time - start_time:.3f} seconds")
@@ -176,59 +273,38 @@ def BlobTrigger(myblob: func.InputStream):
         logging.error(f"Error processing blob {myblob.name}: {e}")
 
 
-def save_to_blob_with_sentiment(data, blob_name):
-    try:
-        #Initialise BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
-
-        #Get the articles-sentiment container
-        container_client = blob_service_client.get_container_client("articles-sentiment")
-        if not container_client.exists():
-            container_client.create_container()
-
-        # Upload the JSON data as a blob
-        blob_client = container_client.get_blob_client(blob_name)
-        blob_content = json.dumps(data, ensure_ascii=False, indent=4)
-        blob_client.upload_blob(blob_content, overwrite=True)
-
-        logging.info(f"Uploaded {blob_name} to Blob Storage in container articles-sentiment.")
-
-    except Exception as e:
-        logging.error(f"Error uploading sentiment data to Blob Storage: {e}")
-
-
 '''
 Function 3: Generate Fake Articles
 An HTTP trigger function to generate fake article data and upload it to
 Blob storage.
 '''
 @app.route(route="GenerateFakeArticles", auth_level=func.AuthLevel.ANONYMOUS)
-def GenerateFakeArticles(req: func.HttpRequest) -> func.HttpResponse:
+async def GenerateFakeArticles(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Python HTTP trigger function processed a request.')
 
     count = 10
 
     try:
-        #Initialise BlobServiceClient
-        blob_service_client = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
-        container_name = "articles-data"
+        #Get the articles-data container
+        container_client = await _async_container("articles-data")
 
-         #Get the articles-sentiment container
-        container_client = blob_service_client.get_container_client(container_name)
-        if not container_client.exists():
-            container_client.create_container()
+        #The content is the same for every fake article, so serialise it once (minus the
+        #closing brace) and only splice in each article's title and url
+        template = orjson.dumps({
+            "content": "This is a generated fake article for scalability testing purposes."
+        })[:-1]
 
         # Generate mock data/article
+        uploads = []
         for i in range(count):
-            fake_article = {
-                "title": f"Fake Article {i+1}",
-                "content": "This is a generated fake article for scalability testing purposes.",
-                "url": f"https://fakeurl.com/article-{i+1}"
-            }
+            fake_article = template + f',"title":"Fake Article {i+1}","url":"https://fakeurl.com/article-{i+1}"}}'.encode()
             #Upload the JSON data as a blob
             blob_name = f"fake-article-{i+1}.json"
             blob_client = container_client.get_blob_client(blob_name)
-            blob_client.upload_blob(json.dumps(fake_article), overwrite=True)
+            uploads.append(blob_client.upload_blob(fake_article, overwrite=True))
+
+        #Issue all uploads concurrently
+        await asyncio.gather(*uploads)
 
         logging.info(f"Generated and uploaded {count} fake articles.")
         return func.HttpResponse(f"Successfully generated and uploaded {count} fake articles.", status_code=200)
@@ -237,3 +313,22 @@ def GenerateFakeArticles(req: func.HttpRequest) -> func.HttpResponse:
         logging.error(f"Error generating fake articles: {e}")
         return func.HttpResponse(f"An error occurred: {str(e)}", status_code=500)
 
+
+'''
+Worker warm-up
+Runs once when the worker loads this module, so the first timer, blob or HTTP
+invocation doesn't pay for loading the parser, sentiment lexicon or blob client.
+'''
+def _warmup():
+    global _BLOB_SVC
+    try:
+        _VADER.polarity_scores("Warm up the sentiment analyser.")
+        BeautifulSoup("<article><h1>Warm up</h1></article>", 'lxml', parse_only=_ARTICLE_FILTER)
+
+        if BLOB_CONNECTION_STRING and _BLOB_SVC is None:
+            _BLOB_SVC = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
+
+    except Exception as e:
+        logging.warning(f"Worker warm-up failed: {e}")
+
+_warmup()